@@ -8,186 +8,1789 @@ corresponding YouTube content and embedding original album artwork.
 
 import os
 import sys
+import glob
+import argparse
+import json
+import time
+import zlib
+import base64
+import queue
+import struct
+import contextlib
+import shutil
+import socket
+import sqlite3
+import hashlib
+import functools
+import subprocess
+import tempfile
+import threading
 import concurrent.futures
-import urllib.request
-from mutagen.id3 import ID3, APIC
-from mutagen.mp3 import MP3
-import yt_dlp
-from youtube_search import YoutubeSearch
-import spotipy
-from spotipy.oauth2 import SpotifyClientCredentials
+import pathlib
+import urllib.parse
+from collections import OrderedDict
+
+# yt_dlp, youtube_search, spotipy and requests are imported where they are
+# first needed, so --help, dry runs and no-op syncs start quickly
 
 # **************REFER TO DOCUMENTATION FOR SETUP AND USAGE**************
 
-class PlaylistArchiver:
-    def __init__(self, client_id, client_secret, username):
-        self.auth = SpotifyClientCredentials(
-            client_id=client_id,
-            client_secret=client_secret
+FFMPEG = shutil.which('ffmpeg') or 'ffmpeg'
+MAX_DOWNLOAD_WORKERS = 64
+HANDOFF_PREFIX = 'ready-'
+# Tags handoff files so shard hosts sharing a staging directory can tell them apart
+HOST_TOKEN = f"{zlib.crc32(socket.gethostname().encode()):08x}"
+THROTTLE_STATUSES = (429, 403)
+
+# Starting point and ceiling for each host's adaptive limits
+HOST_LIMITS = {
+    'spotify': {'limit': 4, 'max_limit': 16, 'rate': 10.0, 'max_rate': 50.0, 'slow_latency': 2.0},
+    'youtube': {'limit': 4, 'max_limit': MAX_DOWNLOAD_WORKERS, 'rate': 5.0, 'max_rate': 50.0},
+    'images': {'limit': 8, 'max_limit': 32, 'rate': 20.0, 'max_rate': 100.0, 'slow_latency': 2.0},
+}
+OUTPUT_FORMATS = ('mp3', 'native')
+
+# Containers a downloaded stream can be stored in without re-encoding
+NATIVE_CONTAINERS = {
+    '.webm': '.opus',
+    '.opus': '.opus',
+    '.ogg': '.ogg',
+    '.m4a': '.m4a',
+    '.mp4': '.m4a',
+    '.mp3': '.mp3',
+}
+
+
+class ArchivePipeline:
+    """Chain of worker stages connected by bounded queues
+
+    Each stage owns its own thread pool, so a slow stage only holds up
+    its own workers while upstream stages keep filling its queue.
+    """
+    _DONE = object()
+
+    def __init__(self, queue_size=16, on_error=None):
+        self.queue_size = queue_size
+        self.on_error = on_error
+        self.stages = []
+
+    def add_stage(self, name, handler, workers=1):
+        """Append a stage; the handler returns the job to pass on, or None to drop it"""
+        self.stages.append({
+            'name': name,
+            'handler': handler,
+            'workers': max(1, workers),
+            'inbox': queue.Queue(maxsize=self.queue_size),
+            'lock': threading.Lock(),
+        })
+        return self
+
+    def run(self, jobs):
+        """Feed jobs through every stage and block until all are drained"""
+        if not self.stages:
+            return
+        
+        threads = []
+        for index, stage in enumerate(self.stages):
+            stage['remaining'] = stage['workers']
+            for n in range(stage['workers']):
+                thread = threading.Thread(
+                    target=self._work,
+                    args=(index,),
+                    name=f"{stage['name']}-{n}",
+                    daemon=True
+                )
+                thread.start()
+                threads.append(thread)
+        
+        # Stop markers go out even if the job iterator raises, so every
+        # stage drains and exits before the error reaches the caller
+        head = self.stages[0]
+        try:
+            for job in jobs:
+                head['inbox'].put(job)
+        finally:
+            for _ in range(head['workers']):
+                head['inbox'].put(self._DONE)
+            for thread in threads:
+                thread.join()
+
+    def _work(self, index):
+        """Worker loop for a single stage"""
+        stage = self.stages[index]
+        downstream = self.stages[index + 1] if index + 1 < len(self.stages) else None
+        
+        while True:
+            job = stage['inbox'].get()
+            if job is self._DONE:
+                break
+            try:
+                result = stage['handler'](job)
+            except Exception as e:
+                result = None
+                if self.on_error:
+                    self.on_error(stage['name'], job, e)
+                else:
+                    print(f"{stage['name']} stage failed: {str(e)}")
+            if result is not None and downstream:
+                downstream['inbox'].put(result)
+        
+        # The last worker out hands one stop marker to every downstream worker
+        with stage['lock']:
+            stage['remaining'] -= 1
+            last = stage['remaining'] == 0
+        if last and downstream:
+            for _ in range(downstream['workers']):
+                downstream['inbox'].put(self._DONE)
+
+
+def timed(stage):
+    """Record each call of a PlaylistArchiver method as one sample of a stage"""
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.stats.measure(stage):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class RunStats:
+    """Per-stage latencies, bytes moved, retries and errors for one archiver run"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.clock = time.monotonic()
+        self.stages = {}
+        self.unchanged = []
+
+    def _stage(self, name):
+        return self.stages.setdefault(
+            name, {'latencies': [], 'errors': 0, 'retries': 0, 'bytes': 0}
+        )
+
+    @contextlib.contextmanager
+    def measure(self, stage):
+        start = time.monotonic()
+        try:
+            yield
+        except Exception:
+            with self.lock:
+                self._stage(stage)['errors'] += 1
+            raise
+        latency = time.monotonic() - start
+        with self.lock:
+            self._stage(stage)['latencies'].append(latency)
+
+    def skip_playlist(self, name):
+        """Note a playlist whose snapshot was already archived"""
+        with self.lock:
+            self.unchanged.append(name)
+
+    def add_bytes(self, stage, count):
+        with self.lock:
+            self._stage(stage)['bytes'] += count
+
+    def add_retry(self, stage):
+        with self.lock:
+            self._stage(stage)['retries'] += 1
+
+    def report(self, scheduler=None):
+        """Summary with latency percentiles and throughput for every stage"""
+        wall = max(time.monotonic() - self.clock, 1e-9)
+        stages = {}
+        with self.lock:
+            for name, stage in self.stages.items():
+                latencies = sorted(stage['latencies'])
+                stages[name] = {
+                    'count': len(latencies),
+                    'errors': stage['errors'],
+                    'retries': stage['retries'],
+                    'bytes': stage['bytes'],
+                    'latency': {
+                        'mean': sum(latencies) / len(latencies) if latencies else 0.0,
+                        'p50': percentile(latencies, 50),
+                        'p90': percentile(latencies, 90),
+                        'p99': percentile(latencies, 99),
+                        'max': latencies[-1] if latencies else 0.0,
+                    },
+                    'per_second': len(latencies) / wall,
+                    'bytes_per_second': stage['bytes'] / wall,
+                }
+        report = {
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+            'wall_seconds': wall,
+            'stages': stages,
+            'unchanged_playlists': list(self.unchanged),
+        }
+        if scheduler:
+            report['hosts'] = {
+                name: {'limit': host.limit, 'rate': host.rate, 'throttled': host.throttled}
+                for name, host in scheduler.hosts.items()
+            }
+        return report
+
+
+class HostLimiter:
+    """Concurrency limit and token bucket for one host, tuned AIMD-style
+
+    Successful calls grow the concurrency limit by roughly one per window
+    and nudge the request rate up. A throttled call (429/403) halves both
+    and pauses the host for a cooldown that doubles while throttling
+    continues; calls slower than `slow_latency` shrink the limit gently.
+    """
+
+    def __init__(self, name, limit=4, max_limit=32, rate=5.0, max_rate=50.0,
+                 slow_latency=None, min_rate=0.2):
+        self.name = name
+        self.limit = float(min(limit, max_limit))
+        self.max_limit = max_limit
+        self.rate = rate
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.slow_latency = slow_latency
+        self.tokens = 1.0
+        self.stamp = time.monotonic()
+        self.in_flight = 0
+        self.cooldown = 1.0
+        self.resume_at = 0.0
+        self.throttled = 0
+        self.cond = threading.Condition()
+
+    def acquire(self):
+        """Block until both a concurrency slot and a rate token are available"""
+        with self.cond:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(max(1.0, self.rate), self.tokens + (now - self.stamp) * self.rate)
+                self.stamp = now
+                
+                wait = self.resume_at - now
+                if wait <= 0 and self.in_flight < int(self.limit):
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        self.in_flight += 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+                self.cond.wait(timeout=wait if wait > 0 else None)
+
+    def release(self, latency=None, throttled=False):
+        """Return a slot and adapt the limits; latency None means no signal"""
+        with self.cond:
+            self.in_flight -= 1
+            if throttled:
+                self.throttled += 1
+                self.limit = max(1.0, self.limit / 2)
+                self.rate = max(self.min_rate, self.rate / 2)
+                self.resume_at = time.monotonic() + self.cooldown
+                self.cooldown = min(self.cooldown * 2, 60.0)
+                print(f"{self.name} is throttling, backing off to {int(self.limit)} "
+                      f"concurrent / {self.rate:.1f} per second")
+            elif latency is not None:
+                self.cooldown = 1.0
+                if self.slow_latency and latency > self.slow_latency:
+                    self.limit = max(1.0, self.limit * 0.9)
+                else:
+                    self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+                    self.rate = min(self.max_rate, self.rate + 0.1)
+            self.cond.notify_all()
+
+    @contextlib.contextmanager
+    def slot(self):
+        self.acquire()
+        start = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            self.release(throttled=is_throttled(e))
+            raise
+        self.release(time.monotonic() - start)
+
+
+class AdaptiveScheduler:
+    """Per-host limiters for the Spotify API, YouTube and the image CDN"""
+
+    def __init__(self, hosts=None):
+        self.hosts = {
+            name: HostLimiter(name, **settings)
+            for name, settings in (hosts or HOST_LIMITS).items()
+        }
+
+    def slot(self, host):
+        """Context manager holding one admitted request against host"""
+        return self.hosts[host].slot()
+
+    def max_workers(self, host):
+        """Threads needed to let host reach its concurrency ceiling"""
+        return self.hosts[host].max_limit
+
+
+class ArchiveManifest:
+    """SQLite record of archived tracks kept inside a playlist directory
+
+    Tracks are keyed by their Spotify URL and remember the matched YouTube
+    video, the output file and its SHA-256, so re-runs only handle the delta.
+    Paths are stored relative to the directory, so the archive keeps working
+    when it is moved or reached through a different path.
+    """
+    FILENAME = 'manifest.db'
+
+    def __init__(self, directory, readonly=False):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.recorded = 0
+        path = os.path.join(directory, self.FILENAME)
+        if readonly:
+            # Dry runs only look: an existing manifest is opened without write access
+            uri = pathlib.Path(os.path.abspath(path)).as_uri() + '?mode=ro'
+            self.conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            return
+        os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript("""
+        CREATE TABLE IF NOT EXISTS playlist (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        CREATE TABLE IF NOT EXISTS tracks (
+            url TEXT PRIMARY KEY,
+            video_id TEXT,
+            path TEXT,
+            sha256 TEXT,
+            archived_at REAL DEFAULT (strftime('%s', 'now'))
+        );
+        CREATE INDEX IF NOT EXISTS tracks_path ON tracks (path);
+        CREATE TABLE IF NOT EXISTS journal (
+            url TEXT PRIMARY KEY,
+            target TEXT,
+            started_at REAL DEFAULT (strftime('%s', 'now')),
+            host TEXT,
+            pid INTEGER
+        );
+        """)
+        # Journals from before owners were recorded lack the host/pid columns
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(journal)")}
+        for column, kind in (('host', 'TEXT'), ('pid', 'INTEGER')):
+            if column not in columns:
+                self.conn.execute(f"ALTER TABLE journal ADD COLUMN {column} {kind}")
+        self.conn.commit()
+
+    @classmethod
+    def existing(cls, directory):
+        """Read-only manifest for directory, or None when it has never been archived"""
+        if not os.path.isfile(os.path.join(directory, cls.FILENAME)):
+            return None
+        return cls(directory, readonly=True)
+
+    @property
+    def snapshot_id(self):
+        """Spotify snapshot the archive was last fully synced to"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value FROM playlist WHERE key = 'snapshot_id'"
+            ).fetchone()
+        return row[0] if row else None
+
+    @snapshot_id.setter
+    def snapshot_id(self, value):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO playlist (key, value) VALUES ('snapshot_id', ?)",
+                (value,)
+            )
+            self.conn.commit()
+
+    def is_archived(self, url):
+        """True when the track was recorded, its output file is still present
+        and no other track has claimed the same file since"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT path FROM tracks WHERE url = ?", (url,)
+            ).fetchone()
+            shared = row and self.conn.execute(
+                "SELECT 1 FROM tracks WHERE path = ? AND url != ? LIMIT 1", (row[0], url)
+            ).fetchone()
+        return bool(row) and not shared and os.path.isfile(self._resolve(row[0]))
+
+    def path_for(self, url):
+        """Output file recorded for url, or None when missing on disk"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT path FROM tracks WHERE url = ?", (url,)
+            ).fetchone()
+        path = self._resolve(row[0]) if row else None
+        return path if path and os.path.isfile(path) else None
+
+    def path_for_video(self, video_id):
+        """Output file recorded for a video under any URL, or None when missing on disk"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT path FROM tracks WHERE video_id = ?", (video_id,)
+            ).fetchall()
+        for (path,) in rows:
+            if os.path.isfile(self._resolve(path)):
+                return self._resolve(path)
+        return None
+
+    def _relative(self, path):
+        return os.path.relpath(path, self.directory)
+
+    def _resolve(self, path):
+        return os.path.join(self.directory, path)
+
+    def begin(self, url, target):
+        """Journal a track as in flight, owned by this process, until it is recorded"""
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO journal (url, target, host, pid) VALUES (?, ?, ?, ?)",
+                (url, self._relative(target), socket.gethostname(), os.getpid())
+            )
+            self.conn.commit()
+
+    def recover(self):
+        """Clear half-written outputs left by tracks in flight when a previous run died
+
+        Only entries whose owning process on this host is gone are touched;
+        other hosts sharing the volume (shard runs) recover their own.
+        """
+        host = socket.gethostname()
+        with self.lock:
+            rows = self.conn.execute("SELECT url, target, host, pid FROM journal").fetchall()
+            stale = [
+                (url, target) for url, target, owner, pid in rows
+                if owner is None or (owner == host and not process_alive(pid))
+            ]
+            for url, target in stale:
+                for partial in glob.glob(glob.escape(self._resolve(target)) + '.incomplete.*'):
+                    os.remove(partial)
+                self.conn.execute("DELETE FROM journal WHERE url = ?", (url,))
+            self.conn.commit()
+        if stale:
+            print(f"Recovered {len(stale)} interrupted tracks in {self.directory}")
+        return len(stale)
+
+    def record(self, url, video_id, path, digest=None):
+        """Store a finished track along with the hash of its output file"""
+        digest = digest or file_digest(path)
+        with self.lock:
+            # Whatever else pointed at this file has been overwritten
+            self.conn.execute(
+                "DELETE FROM tracks WHERE path = ? AND url != ?", (self._relative(path), url)
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO tracks (url, video_id, path, sha256) VALUES (?, ?, ?, ?)",
+                (url, video_id, self._relative(path), digest)
+            )
+            self.conn.execute("DELETE FROM journal WHERE url = ?", (url,))
+            self.conn.commit()
+            self.recorded += 1
+
+    def close(self):
+        self.conn.close()
+
+
+class MatchCache:
+    """Persistent search query to YouTube URL cache shared by every run
+
+    Entries expire after `ttl` seconds and the least recently used ones are
+    evicted once the cache holds more than `max_entries`. Pruning runs once
+    on open and then in batches, only after the bound is overshot by 10%.
+    Hits update `used_at` in batches too, rather than committing per read.
+    """
+    FLUSH_EVERY = 256
+
+    def __init__(self, path='match_cache.db', ttl=30 * 24 * 3600, max_entries=50000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.prune_slack = max(1, max_entries // 10)
+        self.touched = {}
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript("""
+        CREATE TABLE IF NOT EXISTS matches (
+            query TEXT PRIMARY KEY,
+            url TEXT,
+            stored_at REAL,
+            used_at REAL
+        );
+        CREATE INDEX IF NOT EXISTS matches_used_at ON matches (used_at);
+        CREATE INDEX IF NOT EXISTS matches_stored_at ON matches (stored_at);
+        """)
+        self.conn.commit()
+        with self.lock:
+            self._prune()
+
+    def get(self, query):
+        """Cached URL for the query, or None when missing or expired"""
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT url FROM matches WHERE query = ? AND stored_at > ?",
+                (query, now - self.ttl)
+            ).fetchone()
+            if row:
+                self.touched[query] = now
+                if len(self.touched) >= self.FLUSH_EVERY:
+                    self._flush()
+        return row[0] if row else None
+
+    def put(self, query, url):
+        """Store a match, trimming the cache once it is well past its size bound"""
+        now = time.time()
+        with self.lock:
+            self.touched.pop(query, None)
+            existing = self.conn.execute(
+                "SELECT 1 FROM matches WHERE query = ?", (query,)
+            ).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO matches (query, url, stored_at, used_at) VALUES (?, ?, ?, ?)",
+                (query, url, now, now)
+            )
+            if not existing:
+                self.size += 1
+            self._flush()
+            if self.size > self.max_entries + self.prune_slack:
+                self._prune()
+
+    def flush(self):
+        """Write out the batched `used_at` updates"""
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        if self.touched:
+            self.conn.executemany(
+                "UPDATE matches SET used_at = ? WHERE query = ?",
+                [(used_at, query) for query, used_at in self.touched.items()]
+            )
+            self.touched.clear()
+        self.conn.commit()
+
+    def _prune(self):
+        """Drop expired entries, then the least recently used beyond max_entries"""
+        self._flush()
+        self.conn.execute(
+            "DELETE FROM matches WHERE stored_at <= ?", (time.time() - self.ttl,)
         )
-        self.api = spotipy.Spotify(auth_manager=self.auth)
+        self.conn.execute(
+            "DELETE FROM matches WHERE query IN "
+            "(SELECT query FROM matches ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+        self.conn.commit()
+        self.size = self.conn.execute("SELECT COUNT(*) FROM matches").fetchone()[0]
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+
+class ArtworkCache:
+    """In-memory LRU of cover image bytes keyed by image URL
+
+    Concurrent requests for the same URL wait on a single fetch. When a
+    directory is given, images are also kept on disk under a hash of the URL.
+    """
+
+    def __init__(self, max_items=256, directory=None):
+        self.max_items = max_items
+        self.directory = directory
+        self.items = OrderedDict()
+        self.pending = {}
+        self.lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self, url, fetch):
+        """Image bytes for url, calling fetch(url) only on a miss"""
+        with self.lock:
+            if url in self.items:
+                self.items.move_to_end(url)
+                return self.items[url]
+            waiter = self.pending.get(url)
+            if waiter is None:
+                self.pending[url] = threading.Event()
+        
+        if waiter is not None:
+            waiter.wait()
+            with self.lock:
+                if url in self.items:
+                    return self.items[url]
+            return self.get(url, fetch)
+        
+        data = None
+        try:
+            data = self._load(url)
+            if data is None:
+                data = fetch(url)
+                if data:
+                    self._store(url, data)
+        finally:
+            with self.lock:
+                if data:
+                    self.items[url] = data
+                    while len(self.items) > self.max_items:
+                        self.items.popitem(last=False)
+                self.pending.pop(url).set()
+        return data
+
+    def _disk_path(self, url):
+        return os.path.join(self.directory, hashlib.sha1(url.encode()).hexdigest() + '.jpg')
+
+    def _load(self, url):
+        if not self.directory or not os.path.isfile(self._disk_path(url)):
+            return None
+        with open(self._disk_path(url), 'rb') as f:
+            return f.read()
+
+    def _store(self, url, data):
+        if self.directory:
+            with open(self._disk_path(url), 'wb') as f:
+                f.write(data)
+
+
+class Track:
+    """Compact record of one playlist track, parsed from a Spotify API item
+
+    Slots keep each record small for 10k+ track playlists. The mapping
+    methods let a Track stand in wherever a track dict is read, so jobs
+    (`dict(track, ...)`) and plan lines are built from it unchanged.
+    """
+    __slots__ = ('id', 'title', 'artist', 'album', 'track_number', 'isrc', 'artwork', 'url')
+
+    def __init__(self, id, title, artist, album, track_number, isrc, artwork, url):
+        self.id = id
+        self.title = title
+        self.artist = artist
+        self.album = album
+        self.track_number = track_number
+        self.isrc = isrc
+        self.artwork = artwork
+        self.url = url
+
+    @classmethod
+    def from_item(cls, track):
+        """Build from a raw track object; raises KeyError/TypeError/IndexError if unavailable"""
+        return cls(
+            track['id'],
+            track['name'],
+            track['artists'][0]['name'],
+            track['album']['name'],
+            track.get('track_number'),
+            (track.get('external_ids') or {}).get('isrc'),
+            track['album']['images'][0]['url'],
+            track['external_urls']['spotify']
+        )
+
+    def keys(self):
+        return self.__slots__
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.__slots__ else default
+
+    def __repr__(self):
+        return f"Track({self.artist!r}, {self.title!r})"
+
+
+class PlaylistArchiver:
+    def __init__(self, client_id, client_secret, username, match_cache=None, artwork_cache=None,
+                 output_format='mp3', target_bitrate=None, ytdlp_search=False,
+                 output_root='.', download_dir=None, scheduler=None, http_session=None,
+                 http_pool_size=32, http_timeout=(5, 30)):
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format: {output_format}")
+        
+        self.client_id = client_id
+        self.client_secret = client_secret
         self.username = username
+        self.http_pool_size = http_pool_size
+        self.http_timeout = http_timeout
+        self._http = http_session
+        self._api = None
+        self._client_lock = threading.Lock()
+        self.output_root = output_root
+        self._match_cache = match_cache
+        self.artwork_cache = artwork_cache or ArtworkCache()
+        self.output_format = output_format
+        self.target_bitrate = target_bitrate
+        self.ytdlp_search = ytdlp_search
+        self.download_dir = download_dir or os.path.join(output_root, '.downloads')
+        self.scheduler = scheduler or AdaptiveScheduler()
+        self.stats = RunStats()
+        self.report_path = None
+        # Playlists whose last listing lost pages to API errors
+        self.incomplete = set()
+        self._local = threading.local()
+        self._video_locks = {}
+        self._video_locks_guard = threading.Lock()
+        # Downloads waiting for (or in) the transcoder; caps staged raw streams
+        self._staged = threading.BoundedSemaphore(2 * transcode_workers())
+
+    @property
+    def http(self):
+        """Shared keep-alive session, created on first use"""
+        with self._client_lock:
+            if self._http is None:
+                self._http = build_http_session(self.http_pool_size)
+            return self._http
+
+    @property
+    def match_cache(self):
+        """Search cache in the output root, opened on first use so dry runs leave no files"""
+        with self._client_lock:
+            if self._match_cache is None:
+                os.makedirs(self.output_root, exist_ok=True)
+                self._match_cache = MatchCache(os.path.join(self.output_root, 'match_cache.db'))
+            return self._match_cache
+
+    @property
+    def api(self):
+        """Spotify client, built on first use so runs that never call Spotify skip spotipy"""
+        if self._api is None:
+            session = self.http
+            with self._client_lock:
+                if self._api is None:
+                    import spotipy
+                    from spotipy.oauth2 import SpotifyClientCredentials
+                    self.auth = SpotifyClientCredentials(
+                        client_id=self.client_id,
+                        client_secret=self.client_secret,
+                        requests_session=session,
+                        requests_timeout=self.http_timeout
+                    )
+                    self._api = spotipy.Spotify(
+                        auth_manager=self.auth,
+                        requests_session=session,
+                        requests_timeout=self.http_timeout
+                    )
+        return self._api
+
+    @api.setter
+    def api(self, client):
+        self._api = client
+
+    def _playlist_dir(self, name):
+        return os.path.join(self.output_root, name)
+
+    def _start_run(self):
+        self.stats = RunStats()
+
+    def _finish_run(self):
+        """Print the per-stage summary and write the JSON report when requested"""
+        if self._match_cache is not None:
+            self._match_cache.flush()
+        report = self.stats.report(self.scheduler)
+        for name, stage in report['stages'].items():
+            latency = stage['latency']
+            print(f"{name:>10}: {stage['count']} done, {stage['errors']} failed, "
+                  f"{stage['retries']} retries, p50 {latency['p50']:.2f}s, "
+                  f"p90 {latency['p90']:.2f}s, p99 {latency['p99']:.2f}s, "
+                  f"{stage['per_second'] * 60:.1f}/min")
+        if self.report_path:
+            with open(self.report_path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+        return report
 
     def fetch_playlist_content(self, playlist_id):
         """Retrieve playlist metadata and track information"""
+        # Only the track total: pages are fetched and parsed by iter_tracks
         playlist = self.api.user_playlist(
             self.username, 
             playlist_id,
-            fields='tracks,next,name'
+            fields='id,name,snapshot_id,tracks.total'
         )
         return playlist
 
+    def list_playlist_ids(self):
+        """IDs of every playlist owned or followed by the configured user"""
+        ids = []
+        page = self.api.user_playlists(self.username)
+        while page:
+            ids.extend(item['id'] for item in page['items'])
+            page = self.api.next(page) if page['next'] else None
+        return ids
+
     def extract_track_data(self, playlist):
-        """Process playlist tracks into structured data"""
-        tracks = []
-        playlist_data = playlist['tracks']
+        """Playlist name and a lazy stream of its Track records"""
+        return playlist['name'], self.iter_tracks(playlist)
+
+    def iter_tracks(self, playlist, page_workers=8, page_size=100):
+        """Yield Track records page by page while the remaining pages are fetched concurrently
+
+        Page offsets are computed from the playlist total, so there is no need
+        to follow each page's `next` link in turn. Pages are yielded in the
+        order they arrive, with at most 2 * page_workers requested ahead.
+        Each page is parsed in the thread that fetched it and its raw JSON
+        dropped straight away, so memory stays flat however long the playlist.
         
-        while True:
-            for item in playlist_data['items']:
-                track = item.get('track', item)
+        A page that still fails after its retries is skipped rather than
+        ending the run; the playlist is then marked incomplete so its
+        snapshot is not pinned and the next sync lists it again.
+        """
+        offsets = iter(range(0, playlist['tracks']['total'], page_size))
+        self.incomplete.discard(playlist['name'])
+        
+        def fetch(offset, attempts=5, backoff=1.0):
+            for attempt in range(attempts):
+                if attempt:
+                    self.stats.add_retry('listing')
+                    time.sleep(backoff * 2 ** (attempt - 1))
                 try:
-                    tracks.append({
-                        'title': track['name'],
-                        'artist': track['artists'][0]['name'],
-                        'artwork': track['album']['images'][0]['url'],
-                        'url': track['external_urls']['spotify']
-                    })
-                except (KeyError, TypeError):
-                    print(f"Skipping unavailable track: {track.get('name', 'Unknown')}")
-            
-            if playlist_data['next']:
-                playlist_data = self.api.next(playlist_data)
-            else:
-                break
+                    with self.stats.measure('listing'), self.scheduler.slot('spotify'):
+                        page = self.api.playlist_items(
+                            playlist['id'],
+                            offset=offset,
+                            limit=page_size,
+                            additional_types=('track',)
+                        )
+                    return self._parse_page(page)
+                except Exception as e:
+                    error = e
+            print(f"Skipping tracks {offset}-{offset + page_size} of "
+                  f"'{playlist['name']}': {str(error)}")
+            self.incomplete.add(playlist['name'])
+            return []
+        
+        with concurrent.futures.ThreadPoolExecutor(max_workers=page_workers) as executor:
+            in_flight = set()
+            while True:
+                for offset in offsets:
+                    in_flight.add(executor.submit(fetch, offset))
+                    if len(in_flight) >= 2 * page_workers:
+                        break
+                if not in_flight:
+                    break
+                done, in_flight = concurrent.futures.wait(
+                    in_flight, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    yield from future.result()
+
+    @staticmethod
+    def _parse_page(page):
+        """Turn one page of playlist items into a list of Track records"""
+        tracks = []
+        for item in page['items']:
+            track = item.get('track', item)
+            try:
+                tracks.append(Track.from_item(track))
+            except (KeyError, TypeError, IndexError):
+                print(f"Skipping unavailable track: {(track or {}).get('name', 'Unknown')}")
+        return tracks
+
+    def sync_playlist(self, playlist_id, workers=1, pipeline=False):
+        """Archive one playlist, doing nothing when its snapshot is unchanged"""
+        playlist = self.fetch_playlist_content(playlist_id)
+        name = playlist['name']
+        manifest = ArchiveManifest(self._playlist_dir(name))
+        unchanged = manifest.snapshot_id == playlist['snapshot_id']
+        manifest.close()
+        if unchanged:
+            # Still a run: scheduled syncs get their summary and report
+            self._start_run()
+            self.stats.skip_playlist(name)
+            print(f"'{name}' is unchanged since the last archive")
+            self._finish_run()
+            return
         
-        return playlist['name'], tracks
+        print(f"Found {playlist['tracks']['total']} tracks in '{name}'")
+        tracks = self.iter_tracks(playlist)
+        self.archive_tracks(name, tracks, workers, pipeline, playlist['snapshot_id'])
+
+    def report_pending(self, playlist_ids=None):
+        """Dry run: list what a sync would archive without matching or downloading
+
+        Nothing is written: manifests are opened read-only, and a playlist
+        with no manifest yet has every track pending.
+        """
+        for playlist_id in playlist_ids or self.list_playlist_ids():
+            playlist = self.fetch_playlist_content(playlist_id)
+            manifest = ArchiveManifest.existing(self._playlist_dir(playlist['name']))
+            if manifest and manifest.snapshot_id == playlist['snapshot_id']:
+                print(f"'{playlist['name']}' is unchanged since the last archive")
+            else:
+                pending = [
+                    track for track in self.iter_tracks(playlist)
+                    if not (manifest and manifest.is_archived(track['url']))
+                ]
+                print(f"'{playlist['name']}': {len(pending)} tracks to archive")
+                for track in pending:
+                    print(f"  {track['artist']} - {track['title']}")
+            if manifest:
+                manifest.close()
 
-    def archive_tracks(self, playlist_name, tracks, workers=1):
-        """Main processing workflow for track archival"""
-        os.makedirs(playlist_name, exist_ok=True)
-        metadata_path = os.path.join(playlist_name, "tracks.csv")
+    def archive_tracks(self, playlist_name, tracks, workers=1, pipeline=False, snapshot_id=None):
+        """Main processing workflow for track archival
+
+        `tracks` may be any iterable, including the lazy iter_tracks stream,
+        so downloads start while later playlist pages are still loading.
+        With workers > 1 the count only seeds YouTube's starting concurrency;
+        the scheduler raises or lowers it from there.
+        """
+        if workers > 1:
+            self.scheduler.hosts['youtube'].limit = float(workers)
+        self._start_run()
+        
+        directory = self._playlist_dir(playlist_name)
+        manifest = ArchiveManifest(directory)
+        manifest.recover()
+        self._clean_staging()
+        counts = {'seen': 0, 'pending': 0}
         
-        with open(metadata_path, 'w', encoding='utf-8') as f:
+        def pending_tracks():
             for track in tracks:
-                f.write(f"{track['title']},{track['artist']},{track['url']},{track['artwork']}\n")
+                counts['seen'] += 1
+                if not manifest.is_archived(track['url']):
+                    counts['pending'] += 1
+                    target = os.path.join(directory, track_filename(track))
+                    manifest.begin(track['url'], target)
+                    yield track
         
-        if workers > 1:
-            self._parallel_process(metadata_path, workers)
+        if pipeline:
+            self._pipeline_process(directory, pending_tracks(), pipeline_workers(self.scheduler), manifest)
         else:
-            self._process_metadata_file(metadata_path)
+            # Downloads hand raw streams to a core-sized pool of FFmpeg jobs;
+            # leaving the block waits for every queued conversion to finish
+            with concurrent.futures.ThreadPoolExecutor(max_workers=transcode_workers()) as transcoder:
+                if workers > 1:
+                    self._parallel_process(pending_tracks(), manifest, transcoder)
+                else:
+                    self._sequential_process(pending_tracks(), manifest, transcoder)
         
-        os.remove(metadata_path)
+        print(f"Archived {manifest.recorded} of {counts['pending']} pending tracks "
+              f"({counts['seen']} in playlist)")
+        # Only pin the snapshot once every track made it, so failures get retried
+        complete = playlist_name not in self.incomplete
+        if snapshot_id and complete and manifest.recorded == counts['pending']:
+            manifest.snapshot_id = snapshot_id
+        manifest.close()
+        self._finish_run()
         print("Archiving completed successfully")
 
-    def _parallel_process(self, metadata_path, max_workers):
-        """Execute processing using thread pool"""
-        with open(metadata_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
+    def archive_library(self, playlist_ids=None, workers=1, library_dir='Library'):
+        """Archive many playlists (default: all of the user's) in one deduplicated run
+
+        Pending tracks are collected into one work set keyed by Spotify ID,
+        then grouped by the YouTube video they resolve to. Each video is
+        downloaded once into library_dir and hard-linked (copied across
+        filesystems) into every playlist directory that contains it.
+        """
+        if workers > 1:
+            self.scheduler.hosts['youtube'].limit = float(workers)
+        self._start_run()
         
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            executor.map(self._process_track, lines)
+        work = {}
+        playlists = []
+        for playlist_id in playlist_ids or self.list_playlist_ids():
+            playlist = self.fetch_playlist_content(playlist_id)
+            manifest = ArchiveManifest(self._playlist_dir(playlist['name']))
+            if manifest.snapshot_id == playlist['snapshot_id']:
+                self.stats.skip_playlist(playlist['name'])
+                print(f"'{playlist['name']}' is unchanged since the last archive")
+                manifest.close()
+                continue
+            manifest.recover()
+            
+            pending = 0
+            for track in self.iter_tracks(playlist):
+                if manifest.is_archived(track['url']):
+                    continue
+                entry = work.setdefault(track['id'], {'track': track, 'links': []})
+                entry['links'].append((manifest, track))
+                pending += 1
+            if playlist['name'] in self.incomplete:
+                playlists.append((manifest, None, pending))
+            else:
+                playlists.append((manifest, playlist['snapshot_id'], pending))
+        
+        library = ArchiveManifest(self._playlist_dir(library_dir))
+        library.recover()
+        self._clean_staging()
+        max_workers = self.scheduler.max_workers('youtube') if workers > 1 else 1
+        with concurrent.futures.ThreadPoolExecutor(max_workers=transcode_workers()) as transcoder:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                videos = {}
+                for entry, yt_url in bounded_map(executor, self._match_entry, work.values(), 2 * max_workers):
+                    if yt_url:
+                        videos.setdefault(youtube_id(yt_url), []).append((entry, yt_url))
+                print(f"{len(work)} distinct tracks across {len(playlists)} playlists "
+                      f"resolve to {len(videos)} videos")
+                
+                archive = functools.partial(self._archive_shared, library=library, transcoder=transcoder)
+                list(executor.map(archive, videos.values()))
+        
+        for manifest, snapshot_id, pending in playlists:
+            if snapshot_id and manifest.recorded == pending:
+                manifest.snapshot_id = snapshot_id
+            manifest.close()
+        library.close()
+        self._finish_run()
+        print("Archiving completed successfully")
 
-    def _process_metadata_file(self, file_path):
-        """Sequential track processing"""
-        with open(file_path, 'r', encoding='utf-8') as f:
+    def write_plan(self, path, playlist_ids=None, workers=1):
+        """Plan phase: list and match pending tracks, writing one JSON line per track
+
+        Each line carries the track metadata, the matched video, the artwork
+        URL and the target path relative to the output root, so the plan can
+        be copied to other hosts and split with execute_plan's shard option.
+        """
+        if workers > 1:
+            self.scheduler.hosts['youtube'].limit = float(workers)
+        max_workers = self.scheduler.max_workers('youtube') if workers > 1 else 1
+        self._start_run()
+        
+        planned = 0
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for playlist_id in playlist_ids or self.list_playlist_ids():
+                    playlist = self.fetch_playlist_content(playlist_id)
+                    manifest = ArchiveManifest(self._playlist_dir(playlist['name']))
+                    entries = (
+                        {'track': track, 'playlist': playlist['name']}
+                        for track in self.iter_tracks(playlist)
+                        if not manifest.is_archived(track['url'])
+                    )
+                    matched = bounded_map(executor, self._match_entry, entries, 2 * max_workers)
+                    for entry, yt_url in matched:
+                        if not yt_url:
+                            continue
+                        f.write(json.dumps(dict(
+                            entry['track'],
+                            playlist=entry['playlist'],
+                            yt_url=yt_url,
+                            video_id=youtube_id(yt_url),
+                            target=os.path.join(entry['playlist'], track_filename(entry['track']))
+                        )) + '\n')
+                        planned += 1
+                    manifest.close()
+        os.replace(path + '.tmp', path)
+        self._finish_run()
+        print(f"Planned {planned} tracks into {path}")
+
+    def execute_plan(self, path, shard=(1, 1), workers=1, output_root=None):
+        """Execute phase: archive this host's deterministic slice of a plan file
+
+        shard is (index, count) with a 1-based index. Entries are assigned by
+        a stable hash of their video ID, so every host agrees on the split and
+        duplicate videos always land on the same host, where the video is
+        downloaded once and linked to each of its targets.
+        """
+        index, count = shard
+        output_root = output_root or self.output_root
+        if workers > 1:
+            self.scheduler.hosts['youtube'].limit = float(workers)
+        self._clean_staging()
+        self._start_run()
+        
+        manifests = {}
+        manifests_lock = threading.Lock()
+        
+        def manifest_for(playlist):
+            with manifests_lock:
+                if playlist not in manifests:
+                    manifests[playlist] = ArchiveManifest(os.path.join(output_root, playlist))
+                    manifests[playlist].recover()
+                return manifests[playlist]
+        
+        def process(group):
+            pending = []
+            existing = None
+            for entry in group:
+                manifest = manifest_for(entry['playlist'])
+                if manifest.is_archived(entry['url']):
+                    existing = existing or manifest.path_for(entry['url'])
+                else:
+                    entry = dict(entry, target=os.path.join(output_root, entry['target']))
+                    manifest.begin(entry['url'], entry['target'])
+                    pending.append((manifest, entry))
+            if not pending:
+                return
+            if existing:
+                try:
+                    self._link_targets(existing, pending)
+                except Exception as e:
+                    print(f"Error processing {group[0]['artist']} - {group[0]['title']}: {str(e)}")
+                return
+            (manifest, entry), links = pending[0], pending[1:]
+            self._process_track(entry, manifest, transcoder, links)
+        
+        groups = {}
+        with open(path, 'r', encoding='utf-8') as f:
             for line in f:
-                self._process_track(line)
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if zlib.crc32(entry['video_id'].encode()) % count == index - 1:
+                    groups.setdefault(entry['video_id'], []).append(entry)
+        
+        with concurrent.futures.ThreadPoolExecutor(max_workers=transcode_workers()) as transcoder:
+            if workers > 1:
+                max_workers = self.scheduler.max_workers('youtube')
+                with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    for _ in bounded_map(executor, process, groups.values(), 2 * max_workers):
+                        pass
+            else:
+                for group in groups.values():
+                    process(group)
+        
+        recorded = sum(manifest.recorded for manifest in manifests.values())
+        for manifest in manifests.values():
+            manifest.close()
+        self._finish_run()
+        print(f"Shard {index}/{count}: archived {recorded} tracks")
+
+    def _match_entry(self, entry):
+        """Resolve one work-set entry to its YouTube URL"""
+        track = entry['track']
+        query = f"{track['artist']} - {track['title']}"
+        try:
+            yt_url, _ = self._resolve_match(query)
+        except Exception as e:
+            print(f"Error processing {query}: {str(e)}")
+            return None
+        if not yt_url:
+            print(f"No YouTube match for: {query}")
+        return yt_url
 
-    def _process_track(self, track_info):
-        """Handle individual track processing"""
-        data = track_info.strip().split(',')
-        if len(data) < 4:
+    def _archive_shared(self, group, library, transcoder):
+        """Download one video for every track resolving to it, or link an existing copy"""
+        entry, yt_url = group[0]
+        track = entry['track']
+        query = f"{track['artist']} - {track['title']}"
+        # Search result URLs carry tracking parameters that vary between
+        # queries, so the library is keyed by the video ID alone
+        video_id = youtube_id(yt_url)
+        existing = library.path_for_video(video_id)
+        if existing:
+            try:
+                self._link_shared(existing, group)
+            except Exception as e:
+                print(f"Error processing {query}: {str(e)}")
             return
-            
-        title, artist, _, artwork_url = data
-        query = f"{artist} - {title}"
+        
+        target = os.path.join(library.directory, video_id)
+        library.begin(video_id, target)
+        self._staged.acquire()
+        try:
+            job = dict(
+                track,
+                query=query,
+                yt_url=yt_url,
+                target=target,
+                cover=self._retrieve_cover(track['artwork'], track['title']),
+                source=self._download_stream(yt_url)
+            )
+            transcoder.submit(self._finish_shared, job, group, library)
+        except Exception as e:
+            self._staged.release()
+            print(f"Error processing {query}: {str(e)}")
+
+    def _finish_shared(self, job, group, library):
+        """Transcode a shared download into the library and link it into its playlists"""
+        try:
+            audio = self._transcode_stage(job)['audio']
+            video_id = youtube_id(job['yt_url'])
+            library.record(video_id, video_id, audio)
+            self._link_shared(audio, group)
+        except Exception as e:
+            print(f"Error processing {job['query']}: {str(e)}")
+        finally:
+            self._staged.release()
+
+    @timed('record')
+    def _link_targets(self, audio, links):
+        """Link a finished file to each (manifest, entry) whose entry names its target"""
+        extension = os.path.splitext(audio)[1]
+        digest = file_digest(audio)
+        for manifest, entry in links:
+            destination = entry['target'] + extension
+            link_file(audio, destination)
+            manifest.record(entry['url'], entry['video_id'], destination, digest)
+
+    @timed('record')
+    def _link_shared(self, audio, group):
+        extension = os.path.splitext(audio)[1]
+        digest = file_digest(audio)
+        for entry, yt_url in group:
+            for manifest, track in entry['links']:
+                destination = os.path.join(manifest.directory, track_filename(track)) + extension
+                link_file(audio, destination)
+                manifest.record(track['url'], youtube_id(yt_url), destination, digest)
+
+    def _parallel_process(self, tracks, manifest, transcoder):
+        """Execute processing using thread pool, with the scheduler gating actual concurrency"""
+        process = functools.partial(self._process_track, manifest=manifest, transcoder=transcoder)
+        max_workers = self.scheduler.max_workers('youtube')
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for _ in bounded_map(executor, process, tracks, 2 * max_workers):
+                pass
+
+    def _pipeline_process(self, directory, tracks, stage_workers, manifest):
+        """Execute processing as overlapping match/artwork/download/transcode/tag stages"""
+        pipeline = ArchivePipeline(on_error=self._stage_failed)
+        record_stage = functools.partial(self._record_stage, manifest=manifest)
+        pipeline.add_stage('match', self._match_stage, stage_workers['match'])
+        pipeline.add_stage('artwork', self._artwork_stage, stage_workers['artwork'])
+        pipeline.add_stage('download', self._download_stage, stage_workers['download'])
+        pipeline.add_stage('transcode', self._transcode_stage, stage_workers['transcode'])
+        pipeline.add_stage('record', record_stage, stage_workers['record'])
+        pipeline.run(
+            dict(
+                track,
+                query=f"{track['artist']} - {track['title']}",
+                target=os.path.join(directory, track_filename(track))
+            )
+            for track in tracks
+        )
+
+    def _match_stage(self, job):
+        job['yt_url'], job['info'] = self._resolve_match(job['query'])
+        if not job['yt_url']:
+            print(f"No YouTube match for: {job['query']}")
+            return None
+        return job
+
+    def _artwork_stage(self, job):
+        job['cover'] = self._retrieve_cover(job['artwork'], job['title'])
+        return job
+
+    def _download_stage(self, job):
+        job['source'] = self._download_stream(job['yt_url'], job.pop('info'))
+        return job
+
+    def _transcode_stage(self, job):
+        job['audio'] = self._transcode(job['source'], job['target'], job, job.get('cover'))
+        return job
+
+    @timed('record')
+    def _record_stage(self, job, manifest):
+        manifest.record(job['url'], youtube_id(job['yt_url']), job['audio'])
+        return job
+
+    def _stage_failed(self, stage, job, error):
+        """Report a dropped job and clear its leftover intermediate files"""
+        print(f"Error processing {job['query']} ({stage}): {str(error)}")
+        if stage == 'download' or stage == 'transcode':
+            self._discard(job.get('source'))
+
+    @staticmethod
+    def _discard(path):
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    def _sequential_process(self, tracks, manifest, transcoder):
+        """Sequential track processing"""
+        for track in tracks:
+            self._process_track(track, manifest, transcoder)
+
+    def _process_track(self, track, manifest, transcoder, links=()):
+        """Match and download a track, then queue its conversion on the transcoder
+
+        A download only starts once the transcoder has room for it, so raw
+        streams cannot pile up in staging when conversion falls behind.
+        A target already on the track (from a plan) is used as given, and the
+        finished file is linked to any further plan entries in `links`.
+        """
+        title = track['title']
+        query = f"{track['artist']} - {title}"
         
         try:
-            yt_url = self._find_youtube_match(query)
+            if track.get('yt_url'):
+                yt_url, info = track['yt_url'], None
+            else:
+                yt_url, info = self._resolve_match(query)
             if not yt_url:
                 print(f"No YouTube match for: {query}")
                 return
                 
-            self._retrieve_cover(artwork_url, title)
-            audio_file = self._download_audio(yt_url, title)
-            self._embed_artwork(audio_file, title)
-            os.remove(f"{title}.jpg")
+            target = track.get('target') or os.path.join(manifest.directory, track_filename(track))
+            self._staged.acquire()
+            try:
+                job = dict(
+                    track,
+                    query=query,
+                    yt_url=yt_url,
+                    target=target,
+                    cover=self._retrieve_cover(track['artwork'], title),
+                    source=self._download_stream(yt_url, info)
+                )
+                return transcoder.submit(self._finish_track, job, manifest, links)
+            except BaseException:
+                self._staged.release()
+                raise
         except Exception as e:
             print(f"Error processing {query}: {str(e)}")
 
-    def _find_youtube_match(self, query, attempts=5):
-        """Locate YouTube video for given query"""
-        for _ in range(attempts):
+    def _finish_track(self, job, manifest, links=()):
+        """Transcode and record a downloaded track, then link it to `links`"""
+        try:
+            self._record_stage(self._transcode_stage(job), manifest)
+            if links:
+                self._link_targets(job['audio'], links)
+        except Exception as e:
+            print(f"Error processing {job['query']}: {str(e)}")
+        finally:
+            self._staged.release()
+
+    @timed('match')
+    def _resolve_match(self, query):
+        """Find the video for a query as (url, info)
+
+        With ytdlp_search enabled, the search runs through yt-dlp's own
+        `ytsearch` and returns the already extracted info, so the download
+        can reuse it without resolving the video a second time. Otherwise
+        (and on cache hits) info is None.
+        """
+        if not self.ytdlp_search:
+            return self._find_youtube_match(query), None
+        
+        cached = self.match_cache.get(query)
+        if cached:
+            return cached, None
+        
+        with self.scheduler.slot('youtube'):
+            result = self._youtube_dl().extract_info(f"ytsearch1:{query}", download=False)
+        entries = [entry for entry in result.get('entries') or [] if entry]
+        if not entries:
+            return None, None
+        url = entries[0].get('webpage_url') or f"https://www.youtube.com/watch?v={entries[0]['id']}"
+        self.match_cache.put(query, url)
+        return url, entries[0]
+
+    def _find_youtube_match(self, query, attempts=5, backoff=0.5):
+        """Locate YouTube video for given query
+
+        Failed searches are retried with backoff; an empty result is an
+        answer, so it returns None straight away.
+        """
+        from youtube_search import YoutubeSearch
+        
+        cached = self.match_cache.get(query)
+        if cached:
+            return cached
+        
+        for attempt in range(attempts):
+            if attempt:
+                self.stats.add_retry('match')
+                time.sleep(backoff * 2 ** (attempt - 1))
             try:
-                results = YoutubeSearch(query, max_results=1).to_dict()
-                if results:
-                    return "https://www.youtube.com" + results[0]['url_suffix']
-            except (IndexError, KeyError):
-                pass
-        return None
+                with self.scheduler.slot('youtube'):
+                    results = YoutubeSearch(query, max_results=1).to_dict()
+                if not results:
+                    return None
+                url = "https://www.youtube.com" + results[0]['url_suffix']
+            except Exception:
+                if attempt == attempts - 1:
+                    raise
+                continue
+            self.match_cache.put(query, url)
+            return url
 
     def _retrieve_cover(self, url, title):
-        """Download album artwork"""
+        """Fetch album artwork bytes, downloading each image at most once"""
         try:
-            with urllib.request.urlopen(url) as response:
-                with open(f"{title}.jpg", 'wb') as img_file:
-                    img_file.write(response.read())
+            return self._cover(url)
         except Exception as e:
             print(f"Cover download failed for {title}: {str(e)}")
+            return None
 
-    def _download_audio(self, url, title):
-        """Download and convert YouTube audio"""
-        config = {
-            'format': 'bestaudio/best',
-            'outtmpl': f"{title}",
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': '192',
-            }],
-            'quiet': True
-        }
+    @timed('artwork')
+    def _cover(self, url):
+        return self.artwork_cache.get(url, self._fetch_image)
+
+    def _fetch_image(self, url):
+        with self.scheduler.slot('images'):
+            response = self.http.get(url, timeout=self.http_timeout)
+            response.raise_for_status()
+        self.stats.add_bytes('artwork', len(response.content))
+        return response.content
+
+    def _format_selector(self):
+        """Smallest audio stream meeting the target bitrate, else the best available"""
+        if not self.target_bitrate:
+            return 'bestaudio/best'
+        return f"worstaudio[abr>={self.target_bitrate}]/bestaudio/best"
+
+    def _youtube_dl(self):
+        """This thread's YoutubeDL, created on first use and reused for every track"""
+        ydl = getattr(self._local, 'ydl', None)
+        if ydl is None:
+            import yt_dlp
+            
+            # Stable per-video names plus .part files let yt-dlp resume
+            # a download interrupted by a crash instead of starting over
+            ydl = yt_dlp.YoutubeDL({
+                'format': self._format_selector(),
+                'outtmpl': os.path.join(self.download_dir, '%(id)s.%(ext)s'),
+                'continuedl': True,
+                'nopart': False,
+                'quiet': True
+            })
+            self._local.ydl = ydl
+        return ydl
+
+    @timed('download')
+    def _download_stream(self, url, info=None):
+        """Download the selected audio stream as-is, leaving conversion to a later stage
+
+        Downloads of the same video are serialised, and each finished file is
+        moved to a unique name before it is handed on, so two tracks that
+        resolve to one video never share (or delete) each other's file.
+        """
+        ydl = self._youtube_dl()
+        with self._video_lock(youtube_id(url)):
+            with self.scheduler.slot('youtube'):
+                if info:
+                    info = ydl.process_ie_result(info, download=True)
+                else:
+                    info = ydl.extract_info(url, download=True)
+            downloads = info.get('requested_downloads') or [{}]
+            path = downloads[0].get('filepath') or ydl.prepare_filename(info)
+            
+            handle, handoff = tempfile.mkstemp(
+                prefix=f"{HANDOFF_PREFIX}{HOST_TOKEN}-{os.getpid()}-",
+                suffix=os.path.splitext(path)[1],
+                dir=os.path.dirname(path) or '.'
+            )
+            os.close(handle)
+            os.replace(path, handoff)
+        self.stats.add_bytes('download', os.path.getsize(handoff))
+        return handoff
+
+    def _clean_staging(self, max_age=3600):
+        """Drop finished downloads orphaned by a crashed run on this host
+
+        Handoff files are named ready-<host>-<pid>-..., so shard hosts sharing
+        the staging directory only ever remove their own dead runs' files.
+        Unowned names from older versions go once older than max_age.
+        Resumable .part files are kept.
+        """
+        cutoff = time.time() - max_age
+        for path in glob.glob(os.path.join(glob.escape(self.download_dir), HANDOFF_PREFIX + '*')):
+            parts = os.path.basename(path).split('-')
+            if len(parts) >= 4 and parts[2].isdigit():
+                stale = parts[1] == HOST_TOKEN and not process_alive(int(parts[2]))
+            else:
+                stale = os.path.getmtime(path) < cutoff
+            if stale:
+                os.remove(path)
+
+    def _video_lock(self, video_id):
+        with self._video_locks_guard:
+            return self._video_locks.setdefault(video_id, threading.Lock())
+
+    @timed('transcode')
+    def _transcode(self, source, target, track=None, cover=None, bitrate='192k'):
+        """Produce the finished output file in a single FFmpeg pass
+
+        Audio is remuxed in native mode and encoded to MP3 otherwise, and the
+        Spotify tags plus cover art are muxed in at the same time, so the
+        file is written exactly once instead of being rewritten to tag it.
+        """
+        container = NATIVE_CONTAINERS.get(os.path.splitext(source)[1].lower())
+        if self.output_format == 'native' and container:
+            output = f"{target}{container}"
+            codec = ['-codec:a', 'copy']
+        else:
+            output = f"{target}.mp3"
+            codec = ['-codec:a', 'libmp3lame', '-b:a', bitrate]
+        extension = os.path.splitext(output)[1]
+        
+        inputs = ['-i', source]
+        outputs = ['-map', '0:a', *codec]
+        stdin = None
+        if cover and extension in ('.opus', '.ogg'):
+            # Ogg has no attached-picture stream; covers live in a Vorbis comment
+            inputs += ['-f', 'ffmetadata', '-i', 'pipe:0']
+            outputs += ['-map_metadata', '1']
+            stdin = ffmetadata({'METADATA_BLOCK_PICTURE': flac_picture(cover)})
+        elif cover:
+            inputs += ['-f', 'image2pipe', '-i', 'pipe:0']
+            outputs += [
+                '-map', '1:v', '-codec:v', 'copy',
+                '-disposition:v', 'attached_pic',
+                '-metadata:s:v', 'title=Album cover',
+                '-metadata:s:v', 'comment=Cover (front)'
+            ]
+            stdin = cover
+        if extension == '.mp3':
+            outputs += ['-id3v2_version', '3']
+        elif extension == '.m4a':
+            # The MP4 muxer drops keys it has no atom for unless told otherwise
+            outputs += ['-movflags', 'use_metadata_tags']
+        for key, value in ffmpeg_tags(track or {}, extension).items():
+            outputs += ['-metadata', f"{key}={value}"]
         
-        with yt_dlp.YoutubeDL(config) as ydl:
-            info = ydl.extract_info(url, download=True)
-            return ydl.prepare_filename(info).replace('.webm', '.mp3').replace('.m4a', '.mp3')
+        # Write under a temporary name and rename on success, so a file with
+        # the final name is always complete
+        partial = f"{os.path.splitext(output)[0]}.incomplete{extension}"
+        try:
+            subprocess.run(
+                [FFMPEG, '-y', '-loglevel', 'error', *inputs, *outputs, partial],
+                input=stdin,
+                stdin=subprocess.DEVNULL if stdin is None else None,
+                check=True
+            )
+            os.replace(partial, output)
+        finally:
+            self._discard(source)
+            self._discard(partial)
+        self.stats.add_bytes('transcode', os.path.getsize(output))
+        return output
+
+
+def build_http_session(pool_size=32):
+    """Keep-alive session whose connection pool is shared by every worker thread
 
-    def _embed_artwork(self, mp3_path, title):
-        """Embed cover art into audio file"""
+    Handing spotipy our own session skips the retrying adapter it would
+    otherwise mount, so the same policy (spotipy's defaults) is set here:
+    429 and 5xx responses are retried with backoff, honouring Retry-After.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    
+    retry = Retry(
+        total=3,
+        connect=None,
+        read=False,
+        allowed_methods=frozenset(['GET', 'POST', 'PUT', 'DELETE']),
+        status=3,
+        backoff_factor=0.3,
+        status_forcelist=(429, 500, 502, 503, 504),
+        respect_retry_after_header=True
+    )
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def bounded_map(executor, fn, items, ahead):
+    """Yield (item, fn(item)) as each call completes, with at most `ahead` in flight
+
+    Unlike executor.map, which submits its whole input up front, a lazy
+    input is only read as fast as the workers get through it. Results come
+    back in completion order, so one slow item never stalls the rest.
+    """
+    items = iter(items)
+    in_flight = {}
+    while True:
+        for item in items:
+            in_flight[executor.submit(fn, item)] = item
+            if len(in_flight) >= ahead:
+                break
+        if not in_flight:
+            break
+        done, _ = concurrent.futures.wait(
+            in_flight, return_when=concurrent.futures.FIRST_COMPLETED
+        )
+        for future in done:
+            yield in_flight.pop(future), future.result()
+
+
+def parse_shard(value):
+    """Parse an 'i/n' shard spec (1-based) into (i, n)"""
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Shard must look like i/n, got: {value}")
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"Shard index must be between 1 and {count}, got: {index}")
+    return index, count
+
+
+def safe_filename(name):
+    """Track title usable as a single file name inside a playlist directory"""
+    for separator in (os.sep, os.altsep, '\0'):
+        if separator:
+            name = name.replace(separator, '_')
+    return name if name.strip('. ') else f"_{name}"
+
+
+def track_filename(track):
+    """Output file name (without extension) for a track, unique within a playlist
+
+    Titles repeat across artists ("Intro"), so the name carries the artist
+    and the Spotify track ID as well.
+    """
+    name = f"{track['artist']} - {track['title']}"
+    if track.get('id'):
+        name = f"{name} [{track['id']}]"
+    return safe_filename(name)
+
+
+def link_file(source, destination):
+    """Hard-link source to destination, copying when a link is not possible"""
+    if os.path.lexists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+    except OSError:
+        base, extension = os.path.splitext(destination)
+        partial = f"{base}.incomplete{extension}"
+        shutil.copy2(source, partial)
+        os.replace(partial, destination)
+
+
+def ffmpeg_tags(track, extension):
+    """FFmpeg -metadata values for a track's Spotify metadata"""
+    tags = {
+        'title': track.get('title'),
+        'artist': track.get('artist'),
+        'album': track.get('album'),
+        'track': track.get('track_number'),
+    }
+    # ISRC has no generic FFmpeg key: ID3 takes the raw frame, Vorbis and MP4
+    # (with use_metadata_tags) a plain key
+    isrc_key = {'.mp3': 'TSRC', '.opus': 'ISRC', '.ogg': 'ISRC', '.m4a': 'ISRC'}.get(extension)
+    if isrc_key:
+        tags[isrc_key] = track.get('isrc')
+    return {key: str(value) for key, value in tags.items() if value}
+
+
+def flac_picture(cover, mime='image/jpeg', description='Cover'):
+    """Base64 FLAC picture block, the form Ogg files use for embedded cover art"""
+    mime = mime.encode('ascii')
+    description = description.encode('utf-8')
+    block = b''.join((
+        struct.pack('>II', 3, len(mime)), mime,
+        struct.pack('>I', len(description)), description,
+        struct.pack('>IIIII', 0, 0, 0, 0, len(cover)), cover
+    ))
+    return base64.b64encode(block).decode('ascii')
+
+
+def ffmetadata(tags):
+    """Serialise tags in FFmpeg's ffmetadata format, escaping its special characters"""
+    lines = [';FFMETADATA1']
+    for key, value in tags.items():
+        for char in '\\=;#\n':
+            value = value.replace(char, '\\' + char)
+        lines.append(f"{key}={value}")
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def is_throttled(error):
+    """Whether an exception from spotipy, requests or yt-dlp reports rate limiting"""
+    response = getattr(error, 'response', None)
+    for status in (getattr(error, 'http_status', None),
+                   getattr(error, 'code', None),
+                   getattr(response, 'status_code', None)):
+        if status in THROTTLE_STATUSES:
+            return True
+    # requests reports exhausted urllib3 retries as "too many 429 error responses"
+    return any(f"HTTP Error {status}" in str(error) or f"too many {status} error" in str(error)
+               for status in THROTTLE_STATUSES)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not values:
+        return 0.0
+    rank = max(1, -(-len(values) * pct // 100))
+    return values[int(rank) - 1]
+
+
+@contextlib.contextmanager
+def profiling(path):
+    """cProfile the block, including worker threads, and dump merged stats to path"""
+    import cProfile
+    import pstats
+    
+    profiles = [cProfile.Profile()]
+    lock = threading.Lock()
+    
+    def profile_thread(*_):
+        # Installed in each new thread; swaps itself for a per-thread profiler
+        profile = cProfile.Profile()
+        with lock:
+            profiles.append(profile)
+        profile.enable()
+    
+    # From 3.12 cProfile sees every thread through sys.monitoring, and only
+    # one profiler may be active at a time
+    per_thread = sys.version_info < (3, 12)
+    if per_thread:
+        threading.setprofile(profile_thread)
+    profiles[0].enable()
+    try:
+        yield
+    finally:
+        profiles[0].disable()
+        if per_thread:
+            threading.setprofile(None)
+        for profile in profiles:
+            profile.create_stats()
+        pstats.Stats(*profiles).dump_stats(path)
+        print(f"Profile written to {path}")
+
+
+def process_alive(pid):
+    """True when a process with this pid is running on this host"""
+    if pid is None:
+        return False
+    if pid == os.getpid():
+        return True
+    if os.name == 'nt':
+        # os.kill would terminate the process on Windows, so ask the kernel instead
+        import ctypes
+        
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x100000, False, pid)  # SYNCHRONIZE
+        if not handle:
+            return False
         try:
-            audio = MP3(mp3_path, ID3=ID3)
-            try:
-                audio.add_tags()
-            except Exception:
-                pass
-            
-            with open(f"{title}.jpg", 'rb') as art_file:
-                audio.tags.add(
-                    APIC(
-                        encoding=3,
-                        mime='image/jpeg',
-                        type=3,
-                        desc='Cover',
-                        data=art_file.read()
-                    )
-                )
-            audio.save()
-        except Exception as e:
-            print(f"Metadata embedding failed for {mp3_path}: {str(e)}")
+            return kernel32.WaitForSingleObject(handle, 0) == 0x102  # WAIT_TIMEOUT
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def youtube_id(url):
+    """Extract the video ID from a YouTube watch URL"""
+    query = urllib.parse.urlparse(url).query
+    return urllib.parse.parse_qs(query).get('v', [url])[0]
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
 
 
-def get_config():
-    """Retrieve configuration from environment or user input"""
-    config = {}
+def get_config(path='settings.cfg', interactive=True):
+    """Retrieve configuration from a settings file, the environment or user input"""
+    config = {
+        'id': os.environ.get('SPOTIPY_CLIENT_ID'),
+        'secret': os.environ.get('SPOTIPY_CLIENT_SECRET'),
+        'username': os.environ.get('SPOTIFY_USERNAME'),
+    }
     
-    if os.path.isfile('settings.cfg'):
+    if os.path.isfile(path):
         import configparser
         parser = configparser.ConfigParser()
-        parser.read('settings.cfg')
+        parser.read(path)
         config['id'] = parser['AUTH']['client_id']
         config['secret'] = parser['AUTH']['client_secret']
         config['username'] = parser['AUTH']['username']
-    else:
+    elif interactive and not all(config.values()):
         config['id'] = input("Spotify Client ID: ").strip()
         config['secret'] = input("Client Secret: ").strip()
         config['username'] = input("Username: ").strip()
@@ -196,23 +1799,141 @@ def get_config():
 
 
 def get_concurrency():
-    """Determine processing concurrency settings"""
-    core_count = os.cpu_count() or 1
-    if core_count <= 1:
-        return 1
-        
+    """Determine download concurrency; transcoding is sized to the cores separately"""
     response = input("Enable parallel processing? [y/N]: ").lower()
     if response not in ('y', 'yes'):
         return 1
         
+    suggested = min(MAX_DOWNLOAD_WORKERS, transcode_workers() * 4)
     try:
-        workers = int(input(f"Worker threads (1-{core_count}): "))
-        return max(1, min(workers, core_count))
+        workers = int(input(f"Download workers (1-{MAX_DOWNLOAD_WORKERS}, suggested {suggested}): "))
+        return max(1, min(workers, MAX_DOWNLOAD_WORKERS))
     except ValueError:
         return 1
 
 
-def main():
+def transcode_workers():
+    """One FFmpeg process per core"""
+    return os.cpu_count() or 1
+
+
+def pipeline_workers(scheduler):
+    """Size each pipeline stage; network stages get enough threads for their host's ceiling"""
+    return {
+        'match': scheduler.max_workers('youtube'),
+        'artwork': scheduler.max_workers('images'),
+        'download': scheduler.max_workers('youtube'),
+        'transcode': transcode_workers(),
+        'record': 1,
+    }
+
+
+def parse_playlist_id(value):
+    """Playlist ID from a bare ID, a spotify:playlist: URI or an open.spotify.com URL"""
+    return value.strip().split('/')[-1].split(':')[-1].split('?')[0]
+
+
+def build_parser():
+    """Command line interface; running with no arguments falls back to the prompts"""
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--config', default='settings.cfg',
+                        help="settings file with an [AUTH] section (default: settings.cfg)")
+    common.add_argument('-o', '--output-dir', default='.',
+                        help="directory that holds playlist folders and caches")
+    common.add_argument('-w', '--workers', type=int, default=1,
+                        help=f"starting download concurrency (1-{MAX_DOWNLOAD_WORKERS})")
+    common.add_argument('-f', '--format', choices=OUTPUT_FORMATS, default='mp3',
+                        help="mp3 re-encodes, native keeps the downloaded codec")
+    common.add_argument('--bitrate', type=int,
+                        help="pick the smallest stream of at least this many kbps")
+    common.add_argument('--ytdlp-search', action='store_true',
+                        help="match through yt-dlp's ytsearch instead of youtube_search")
+    common.add_argument('--report', metavar='PATH',
+                        help="write per-stage timings and throughput as JSON")
+    common.add_argument('--profile', metavar='PATH',
+                        help="cProfile the run and dump pstats data to PATH")
+    
+    parser = argparse.ArgumentParser(
+        description="Archive Spotify playlists as tagged audio files"
+    )
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    archive = commands.add_parser('archive', parents=[common],
+                                  help="sync playlists into the output directory")
+    archive.add_argument('playlists', nargs='*',
+                         help="playlist IDs, URIs or URLs (default: all of the user's)")
+    archive.add_argument('--pipeline', action='store_true',
+                         help="run matching, downloads and transcodes as overlapping stages")
+    archive.add_argument('--dry-run', action='store_true',
+                         help="only list the tracks a sync would archive")
+    
+    plan = commands.add_parser('plan', parents=[common],
+                               help="match tracks and write a plan file for execute")
+    plan.add_argument('plan_file')
+    plan.add_argument('playlists', nargs='*',
+                      help="playlist IDs, URIs or URLs (default: all of the user's)")
+    
+    execute = commands.add_parser('execute', parents=[common],
+                                  help="archive one shard of a plan file")
+    execute.add_argument('plan_file')
+    execute.add_argument('--shard', type=parse_shard, default=(1, 1),
+                         help="1-based slice of the plan to process, as i/n (default: 1/1)")
+    return parser
+
+
+def run(args):
+    """Execute a parsed command line"""
+    if getattr(args, 'pipeline', False) and not args.dry_run and len(args.playlists) != 1:
+        raise SystemExit(
+            "--pipeline needs exactly one playlist; multi-playlist runs use the "
+            "deduplicated library mode"
+        )
+    
+    config = get_config(args.config, interactive=False)
+    if args.command != 'execute' and not all(config.values()):
+        raise SystemExit(
+            "Spotify credentials missing: provide a settings file or set "
+            "SPOTIPY_CLIENT_ID, SPOTIPY_CLIENT_SECRET and SPOTIFY_USERNAME"
+        )
+    
+    archiver = PlaylistArchiver(
+        config['id'],
+        config['secret'],
+        config['username'],
+        output_format=args.format,
+        target_bitrate=args.bitrate,
+        ytdlp_search=args.ytdlp_search,
+        output_root=args.output_dir
+    )
+    archiver.report_path = args.report
+    
+    if args.profile:
+        with profiling(args.profile):
+            dispatch(archiver, args)
+    else:
+        dispatch(archiver, args)
+
+
+def dispatch(archiver, args):
+    """Run the archiver method selected on the command line"""
+    workers = max(1, min(args.workers, MAX_DOWNLOAD_WORKERS))
+    if args.command == 'execute':
+        archiver.execute_plan(args.plan_file, args.shard, workers)
+        return
+    
+    playlist_ids = [parse_playlist_id(value) for value in args.playlists]
+    if args.command == 'plan':
+        archiver.write_plan(args.plan_file, playlist_ids, workers)
+    elif args.dry_run:
+        archiver.report_pending(playlist_ids)
+    elif len(playlist_ids) == 1:
+        archiver.sync_playlist(playlist_ids[0], workers, args.pipeline)
+    else:
+        archiver.archive_library(playlist_ids, workers)
+
+
+def interactive():
+    """Prompt-driven session for running the script without arguments"""
     print("Spotify Playlist Archiver - Initialize")
     config = get_config()
     archiver = PlaylistArchiver(
@@ -221,17 +1942,36 @@ def main():
         config['username']
     )
     
-    playlist_input = input("Playlist URI or URL: ").strip()
-    playlist_id = playlist_input.split('/')[-1].split('?')[0]
+    playlist_input = input("Playlist URIs or URLs (comma separated, blank for all of yours): ")
+    playlist_ids = [
+        parse_playlist_id(entry)
+        for entry in playlist_input.split(',') if entry.strip()
+    ]
+    
+    output_format = input("Output format, mp3 or native [mp3]: ").strip().lower() or 'mp3'
+    archiver.output_format = output_format if output_format in OUTPUT_FORMATS else 'mp3'
     
     workers = get_concurrency()
-    print(f"Using {workers} worker thread{'s' if workers > 1 else ''}")
+    print(f"Using {workers} download worker{'s' if workers > 1 else ''} "
+          f"and {transcode_workers()} transcode worker{'s' if transcode_workers() > 1 else ''}")
     
-    playlist = archiver.fetch_playlist_content(playlist_id)
-    name, tracks = archiver.extract_track_data(playlist)
-    print(f"Found {len(tracks)} tracks in '{name}'")
+    pipeline = False
+    if workers > 1:
+        response = input("Use staged pipeline? [y/N]: ").lower()
+        pipeline = response in ('y', 'yes')
     
-    archiver.archive_tracks(name, tracks, workers)
+    if len(playlist_ids) != 1:
+        archiver.archive_library(playlist_ids, workers)
+    else:
+        archiver.sync_playlist(playlist_ids[0], workers, pipeline)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        interactive()
+        return
+    run(build_parser().parse_args(argv))
 
 
 if __name__ == "__main__":
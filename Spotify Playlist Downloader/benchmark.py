@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark for the Spotify Playlist Archiver
+
+Runs archive_tracks against local stand-ins for every remote service, so
+results are repeatable and nothing is sent to Spotify or YouTube:
+
+- a spotipy-compatible client that builds playlist pages on demand
+- a YoutubeSearch replacement that answers each query with a stable video ID
+- a yt-dlp replacement that "downloads" synthetic WAV audio at a set
+  latency and bandwidth
+- a local HTTP server that serves cover images through the archiver's
+  real keep-alive session
+
+Each scenario runs in a fresh process and reports tracks per minute plus
+peak memory. FFmpeg is skipped (downloads are renamed into place) unless
+--ffmpeg is given. The per-host request rate caps are lifted by default,
+since with them in place every scenario measures the token buckets rather
+than the archiver; --host-limits restores them.
+"""
+
+import os
+import sys
+import time
+import json
+import types
+import zlib
+import struct
+import argparse
+import tempfile
+import threading
+import contextlib
+import tracemalloc
+import multiprocessing
+import concurrent.futures
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from SpotifyPlaylistDownloader import AdaptiveScheduler, HOST_LIMITS, PlaylistArchiver, timed
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PLAYLIST_ID = 'benchmark'
+TRACKS_PER_ALBUM = 10
+
+
+class FakeSpotify:
+    """Stand-in for spotipy.Spotify serving one playlist of generated tracks
+
+    Pages are built when requested rather than stored, so the fake itself
+    holds no per-track state however large the playlist is.
+    """
+
+    def __init__(self, total, image_url, latency=0.05):
+        self.total = total
+        self.image_url = image_url
+        self.latency = latency
+
+    def user_playlist(self, user, playlist_id=None, fields=None):
+        return {
+            'id': PLAYLIST_ID,
+            'name': 'Benchmark',
+            'snapshot_id': f"snapshot-{self.total}",
+            'tracks': {'total': self.total},
+        }
+
+    def user_playlists(self, user):
+        return {'items': [{'id': PLAYLIST_ID}], 'next': None}
+
+    def next(self, page):
+        return None
+
+    def playlist_items(self, playlist_id, offset=0, limit=100, additional_types=None, **kwargs):
+        time.sleep(self.latency)
+        end = min(offset + limit, self.total)
+        return {
+            'items': [{'track': self._track(number)} for number in range(offset, end)],
+            'offset': offset,
+            'limit': limit,
+            'total': self.total,
+            'next': f"{PLAYLIST_ID}?offset={end}" if end < self.total else None,
+        }
+
+    def _track(self, number):
+        album = number // TRACKS_PER_ALBUM
+        return {
+            'id': f"track{number:07d}",
+            'name': f"Track {number:07d}",
+            'artists': [{'name': f"Artist {album % 97}"}],
+            'album': {
+                'name': f"Album {album}",
+                'images': [{'url': f"{self.image_url}/{album}.jpg"}],
+            },
+            'track_number': number % TRACKS_PER_ALBUM + 1,
+            'external_ids': {'isrc': f"BENCH{number:07d}"},
+            'external_urls': {'spotify': f"https://open.spotify.com/track/{number:022d}"},
+        }
+
+
+def video_id(query):
+    """Stable 11 character video ID for a search query"""
+    return f"{zlib.crc32(query.encode()):011d}"
+
+
+def fake_youtube_search(latency):
+    """youtube_search module replacement whose searches take `latency` seconds"""
+    class YoutubeSearch:
+        def __init__(self, query, max_results=1):
+            self.query = query
+
+        def to_dict(self):
+            time.sleep(latency)
+            return [{'url_suffix': f"/watch?v={video_id(self.query)}"}]
+
+    module = types.ModuleType('youtube_search')
+    module.YoutubeSearch = YoutubeSearch
+    return module
+
+
+def synthetic_wav(size):
+    """Silent 44.1kHz 16-bit stereo WAV of roughly `size` bytes"""
+    frames = max(size - 44, 4) // 4 * 4
+    header = struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 36 + frames, b'WAVE', b'fmt ', 16, 1, 2, 44100, 44100 * 4, 4, 16,
+        b'data', frames
+    )
+    return header + bytes(frames)
+
+
+def fake_yt_dlp(audio, latency, bandwidth):
+    """yt_dlp module replacement that writes `audio` after latency + transfer time"""
+    class YoutubeDL:
+        def __init__(self, params=None):
+            self.params = params or {}
+
+        def prepare_filename(self, info):
+            return self.params['outtmpl'] % {'id': info['id'], 'ext': info['ext']}
+
+        def extract_info(self, url, download=True):
+            if url.startswith('ytsearch'):
+                time.sleep(latency)
+                vid = video_id(url.split(':', 1)[1])
+                return {'entries': [{'id': vid, 'ext': 'wav',
+                                     'webpage_url': f"https://www.youtube.com/watch?v={vid}"}]}
+            return self.process_ie_result({'id': url.split('v=')[-1], 'ext': 'wav'}, download)
+
+        def process_ie_result(self, info, download=True):
+            time.sleep(latency + len(audio) / bandwidth)
+            path = self.prepare_filename(info)
+            if download:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'wb') as f:
+                    f.write(audio)
+            return dict(info, requested_downloads=[{'filepath': path}])
+
+    module = types.ModuleType('yt_dlp')
+    module.YoutubeDL = YoutubeDL
+    return module
+
+
+@contextlib.contextmanager
+def image_server(size, latency):
+    """Serve `size` bytes of fake JPEG for any path; yields the base URL"""
+    image = b'\xff\xd8\xff\xe0' + bytes(max(size - 6, 0)) + b'\xff\xd9'
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/jpeg')
+            self.send_header('Content-Length', str(len(image)))
+            self.end_headers()
+            self.wfile.write(image)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/covers"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class OfflineArchiver(PlaylistArchiver):
+    """PlaylistArchiver whose FFmpeg pass is replaced by moving the download into place"""
+
+    @timed('transcode')
+    def _transcode(self, source, target, track=None, cover=None, bitrate='192k'):
+        output = f"{target}.mp3"
+        os.replace(source, output)
+        self.stats.add_bytes('transcode', os.path.getsize(output))
+        return output
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes, or None where unknown"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def run_scenario(scenario, options):
+    """Archive one synthetic playlist and measure it; runs in a fresh process"""
+    sys.modules['youtube_search'] = fake_youtube_search(options['search_latency'])
+    sys.modules['yt_dlp'] = fake_yt_dlp(
+        synthetic_wav(options['audio_bytes']),
+        options['download_latency'],
+        options['bandwidth']
+    )
+    hosts = HOST_LIMITS
+    if not options['host_limits']:
+        hosts = {name: dict(limits, rate=1e6, max_rate=1e6) for name, limits in HOST_LIMITS.items()}
+
+    with tempfile.TemporaryDirectory(prefix='archiver-bench-') as root, \
+            image_server(options['image_bytes'], options['image_latency']) as image_url:
+        archiver_class = PlaylistArchiver if options['ffmpeg'] else OfflineArchiver
+        archiver = archiver_class(
+            'benchmark', 'benchmark', 'benchmark',
+            output_root=root,
+            scheduler=AdaptiveScheduler(hosts)
+        )
+        archiver.api = FakeSpotify(
+            scenario['tracks'],
+            image_url,
+            options['page_latency']
+        )
+
+        tracemalloc.start()
+        start = time.monotonic()
+        with open(os.devnull, 'w') as quiet, contextlib.redirect_stdout(quiet):
+            playlist = archiver.fetch_playlist_content(PLAYLIST_ID)
+            archiver.archive_tracks(
+                playlist['name'],
+                archiver.iter_tracks(playlist),
+                scenario['workers'],
+                scenario['mode'] == 'pipeline'
+            )
+        elapsed = time.monotonic() - start
+        heap_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        archived = len([name for name in os.listdir(os.path.join(root, playlist['name']))
+                        if name.endswith('.mp3')])
+        stages = archiver.stats.report()['stages']
+        archiver.match_cache.close()
+
+    return dict(
+        scenario,
+        archived=archived,
+        seconds=elapsed,
+        tracks_per_minute=archived / elapsed * 60,
+        peak_heap_bytes=heap_peak,
+        peak_rss_bytes=peak_rss(),
+        stage_p50={name: stage['latency']['p50'] for name, stage in stages.items()},
+    )
+
+
+def scenarios(track_counts, worker_counts, modes):
+    """Every (size, mode, workers) combination; sequential always runs one worker"""
+    for tracks in track_counts:
+        for mode in modes:
+            for workers in ([1] if mode == 'sequential' else worker_counts):
+                yield {'tracks': tracks, 'mode': mode, 'workers': workers}
+
+
+def megabytes(value):
+    return f"{value / 2 ** 20:.1f}" if value is not None else '-'
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Benchmark archive_tracks offline against local fake services"
+    )
+    parser.add_argument('--tracks', type=int, nargs='+', default=[100, 1000, 10000],
+                        help="playlist sizes to run (default: 100 1000 10000)")
+    parser.add_argument('--workers', type=int, nargs='+', default=[8, 32],
+                        help="worker counts for the parallel and pipeline modes (default: 8 32)")
+    parser.add_argument('--modes', nargs='+', default=['sequential', 'parallel', 'pipeline'],
+                        choices=['sequential', 'parallel', 'pipeline'])
+    parser.add_argument('--page-latency', type=float, default=0.05,
+                        help="seconds per Spotify page request")
+    parser.add_argument('--search-latency', type=float, default=0.02,
+                        help="seconds per YouTube search")
+    parser.add_argument('--download-latency', type=float, default=0.05,
+                        help="seconds before a download starts transferring")
+    parser.add_argument('--bandwidth', type=float, default=4.0,
+                        help="MB/s per download")
+    parser.add_argument('--audio-kb', type=int, default=64,
+                        help="size of each synthetic download")
+    parser.add_argument('--image-latency', type=float, default=0.02,
+                        help="seconds per cover image request")
+    parser.add_argument('--image-kb', type=int, default=32)
+    parser.add_argument('--host-limits', action='store_true',
+                        help="keep the real per-host request rate caps; throughput is then "
+                             "bounded by the limiter rather than the archiver")
+    parser.add_argument('--ffmpeg', action='store_true',
+                        help="run the real FFmpeg pass instead of renaming downloads")
+    parser.add_argument('--json', metavar='PATH',
+                        help="also write every result as JSON")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    options = {
+        'page_latency': args.page_latency,
+        'search_latency': args.search_latency,
+        'download_latency': args.download_latency,
+        'bandwidth': args.bandwidth * 2 ** 20,
+        'audio_bytes': args.audio_kb * 1024,
+        'image_latency': args.image_latency,
+        'image_bytes': args.image_kb * 1024,
+        'host_limits': args.host_limits,
+        'ffmpeg': args.ffmpeg,
+    }
+
+    if args.host_limits:
+        print("Per-host rate caps are on: results show the limiter's ceiling, "
+              "not differences between scenarios")
+    print(f"{'tracks':>7} {'mode':>10} {'workers':>7} {'archived':>8} {'seconds':>8} "
+          f"{'tracks/min':>10} {'heap MB':>8} {'RSS MB':>7}")
+    results = []
+    # A fresh interpreter per scenario keeps peak memory and caches independent
+    context = multiprocessing.get_context('spawn')
+    for scenario in scenarios(args.tracks, args.workers, args.modes):
+        with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            result = executor.submit(run_scenario, scenario, options).result()
+        results.append(result)
+        print(f"{result['tracks']:>7} {result['mode']:>10} {result['workers']:>7} "
+              f"{result['archived']:>8} {result['seconds']:>8.1f} "
+              f"{result['tracks_per_minute']:>10.0f} {megabytes(result['peak_heap_bytes']):>8} "
+              f"{megabytes(result['peak_rss_bytes']):>7}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'options': options, 'results': results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()